@@ -1,273 +1,386 @@
 import requests
-import json
+import os
+import re
+import fastjsonschema
+import orjson
 import pytest
 import random
+import responses
 import string
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "https://reqres.in/api"
-created_user_id = None
-test_user_data = None
+USERS_URL = f"{BASE_URL}/users"
+REGISTER_URL = f"{BASE_URL}/register"
+LOGIN_URL = f"{BASE_URL}/login"
+REQUEST_TIMEOUT = (3, 10)
+REQUIRED_FIELDS = ("id", "email", "first_name", "last_name")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+REGISTER_DATA = {
+    "email": "eve.holt@reqres.in",
+    "password": "pistol"
+}
+REGISTER_BODY = orjson.dumps(REGISTER_DATA)
+INCOMPLETE_REGISTER_DATA = {
+    "email": "sydney@fife"
+}
+INCOMPLETE_REGISTER_BODY = orjson.dumps(INCOMPLETE_REGISTER_DATA)
+LOGIN_DATA = {
+    "email": "eve.holt@reqres.in",
+    "password": "cityslicka"
+}
+LOGIN_BODY = orjson.dumps(LOGIN_DATA)
+LIVE_API = bool(os.environ.get("API_LIVE"))
+REPLAY_API = bool(os.environ.get("API_REPLAY")) and not LIVE_API
+VERBOSE = bool(os.environ.get("TEST_VERBOSE"))
+
+pytestmark = [pytest.mark.vcr()] if REPLAY_API else []
+
+@pytest.fixture(scope="module")
+def vcr_config():
+    """
+    Настройки записи кассет VCR для режима воспроизведения (API_REPLAY=1).
+    Первый прогон записывает ответы реального API, последующие воспроизводят их с диска.
+    """
+    return {
+        "record_mode": "once",
+        "filter_headers": ["authorization", "x-api-key"]
+    }
 
 def generate_random_string(length=8):
     """
     Генерирует случайную строку указанной длины.
     Полезно для создания уникальных тестовых данных.
     """
-    letters = string.ascii_letters
-    return ''.join(random.choice(letters) for i in range(length))
+    return ''.join(random.choices(string.ascii_letters, k=length))
+
+def user_url(user_id):
+    """
+    Возвращает URL конкретного пользователя.
+    """
+    return f"{USERS_URL}/{user_id}"
+
+class TimeoutSession(requests.Session):
+    """
+    Сессия, которая подставляет таймаут (connect, read) во все запросы,
+    если он не указан явно. Не дает тестам зависать при проблемах с API.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+def response_json(response):
+    """
+    Разбирает JSON-тело ответа с помощью orjson.
+    """
+    return orjson.loads(response.content)
+
+def create_session():
+    """
+    Создает HTTP-сессию с пулом соединений.
+    Переиспользует соединения (keep-alive), чтобы не устанавливать
+    новое TCP/TLS-соединение на каждый запрос.
+    """
+    session = TimeoutSession()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.1)
+    ))
+    return session
+
+@pytest.fixture(scope="module", autouse=True)
+def api_session():
+    """
+    Общая HTTP-сессия для всех тестов модуля.
+    """
+    session = create_session()
+    yield session
+    session.close()
+
+MOCK_USERS = [
+    {"id": user_id, "email": f"{first_name.lower()}.{last_name.lower()}@reqres.in",
+     "first_name": first_name, "last_name": last_name}
+    for user_id, (first_name, last_name) in enumerate([
+        ("George", "Bluth"), ("Janet", "Weaver"), ("Emma", "Wong"),
+        ("Eve", "Holt"), ("Charles", "Morris"), ("Tracey", "Ramos"),
+        ("Michael", "Lawson"), ("Lindsay", "Ferguson"), ("Tobias", "Funke"),
+        ("Byron", "Fields"), ("George", "Edwards"), ("Rachel", "Howell"),
+    ], start=1)
+]
+MOCK_TOKEN = "QpwL5tke4Pnpja7X4"
+
+def _json_reply(status, body=None):
+    return status, {}, b"" if body is None else orjson.dumps(body)
+
+def _request_json(request):
+    return orjson.loads(request.body) if request.body else {}
+
+def _mock_users_list(request):
+    params = parse_qs(urlparse(request.url).query)
+    page = int(params.get("page", ["1"])[0])
+    per_page = int(params.get("per_page", ["6"])[0])
+    start = (page - 1) * per_page
+    return _json_reply(200, {
+        "page": page,
+        "per_page": per_page,
+        "total": len(MOCK_USERS),
+        "total_pages": -(-len(MOCK_USERS) // per_page),
+        "data": MOCK_USERS[start:start + per_page]
+    })
+
+def _mock_single_user(request):
+    user_id = int(urlparse(request.url).path.rsplit("/", 1)[-1])
+    for user in MOCK_USERS:
+        if user["id"] == user_id:
+            return _json_reply(200, {"data": user})
+    return _json_reply(404, {})
+
+def _mock_create_user(request):
+    return _json_reply(201, {**_request_json(request), "id": "123",
+                             "createdAt": "2024-01-01T00:00:00.000Z"})
+
+def _mock_update_user(request):
+    return _json_reply(200, {**_request_json(request),
+                             "updatedAt": "2024-01-01T00:00:00.000Z"})
+
+def _mock_register(request):
+    data = _request_json(request)
+    if "password" not in data:
+        return _json_reply(400, {"error": "Missing password"})
+    return _json_reply(200, {"id": 4, "token": MOCK_TOKEN})
+
+def _mock_login(request):
+    data = _request_json(request)
+    if "password" not in data:
+        return _json_reply(400, {"error": "Missing password"})
+    return _json_reply(200, {"token": MOCK_TOKEN})
+
+def register_api_stubs(mock):
+    """
+    Регистрирует заглушки эндпоинтов reqres.in.
+    Ответы повторяют контракт реального API, но возвращаются без сетевого запроса.
+    """
+    user_pattern = re.compile(re.escape(f"{USERS_URL}/") + r"\d+$")
+    mock.add_callback(responses.GET, re.compile(re.escape(USERS_URL) + r"(\?.*)?$"),
+                      callback=_mock_users_list, content_type="application/json")
+    mock.add_callback(responses.GET, user_pattern, callback=_mock_single_user,
+                      content_type="application/json")
+    mock.add_callback(responses.POST, USERS_URL, callback=_mock_create_user,
+                      content_type="application/json")
+    mock.add_callback(responses.PUT, user_pattern, callback=_mock_update_user,
+                      content_type="application/json")
+    mock.add_callback(responses.PATCH, user_pattern, callback=_mock_update_user,
+                      content_type="application/json")
+    mock.add_callback(responses.DELETE, user_pattern, callback=lambda request: _json_reply(204))
+    mock.add_callback(responses.POST, REGISTER_URL, callback=_mock_register,
+                      content_type="application/json")
+    mock.add_callback(responses.POST, LOGIN_URL, callback=_mock_login,
+                      content_type="application/json")
+
+@pytest.fixture(autouse=True)
+def mock_api():
+    """
+    Подменяет ответы reqres.in заглушками на уровне транспорта requests.
+    При API_LIVE=1 заглушки отключаются и тесты обращаются к реальному API,
+    при API_REPLAY=1 ответы берутся из кассет VCR.
+    """
+    if LIVE_API or REPLAY_API:
+        yield None
+        return
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+        register_api_stubs(mock)
+        yield mock
+
+USER_SCHEMA = {
+    "type": "object",
+    "required": list(REQUIRED_FIELDS),
+    "properties": {
+        "id": {"type": "integer"},
+        "email": {"type": "string", "pattern": "@"}
+    }
+}
+
+validate_users_list = fastjsonschema.compile({
+    "type": "object",
+    "required": ["data", "page"],
+    "properties": {
+        "data": {"type": "array", "minItems": 1, "items": USER_SCHEMA}
+    }
+})
+
+validate_single_user = fastjsonschema.compile({
+    "type": "object",
+    "required": ["data"],
+    "properties": {
+        "data": {**USER_SCHEMA, "properties": {**USER_SCHEMA["properties"], "id": {"const": 2}}}
+    }
+})
+
+validate_users_page = fastjsonschema.compile({
+    "type": "object",
+    "required": ["data", "page"],
+    "properties": {
+        "page": {"const": 2},
+        "data": {"type": "array", "maxItems": 3, "items": USER_SCHEMA}
+    }
+})
+
+GET_USERS_CASES = [
+    pytest.param(USERS_URL, validate_users_list, id="users-list", marks=pytest.mark.live),
+    pytest.param(user_url(2), validate_single_user, id="single-user", marks=pytest.mark.live),
+    pytest.param(f"{USERS_URL}?page=2&per_page=3", validate_users_page, id="pagination",
+                 marks=pytest.mark.live)
+]
 
 def log_request_info(method, url, data=None, response=None):
     """
     Выводит информацию о запросе и ответе для отладки.
     Помогает понять, что происходит во время выполнения тестов.
+    Включается переменной окружения TEST_VERBOSE=1.
     """
+    if not VERBOSE:
+        return
     print(f"\n=== {method} Request to {url} ===")
     if data:
-        print(f"Request body: {json.dumps(data, indent=2)}")
-    if response:
+        print(f"Request body: {orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()}")
+    if response is not None:
         print(f"Status code: {response.status_code}")
-        try:
-            print(f"Response body: {json.dumps(response.json(), indent=2)}")
-        except:
-            print(f"Response body: {response.text}")
+        print(f"Response body: {response.text[:500]}")
     print("=" * 50)
 
-def test_get_users_list():
+@pytest.mark.parametrize("url, validate", GET_USERS_CASES)
+def test_get_users(api_session, url, validate):
     """
-   Тест GET запроса для получения списка пользователей.
-    Проверяет статус-код ответа и структуру данных.
+    Тест GET запросов для получения списка пользователей, конкретного пользователя
+    и страницы с пагинацией. Проверяет статус-код ответа и соответствие данных схеме.
     """
-    url = f"{BASE_URL}/users"
-    response = requests.get(url)
+    response = api_session.get(url)
     log_request_info("GET", url, response=response)
     assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
 
-    response_data = response.json()
-    assert 'data' in response_data, "Ответ не содержит ключ 'data'"
-    assert 'page' in response_data, "Ответ не содержит ключ 'page'"
-
-    user_list = response_data['data']
-    assert len(user_list) > 0, "Список пользователей пуст"
-    required_fields = {'id', 'email', 'first_name', 'last_name'}
-    for user in user_list:
-        user_fields = set(user.keys())
-        missing_fields = required_fields - user_fields
-        assert not missing_fields, f"У пользователя отсутствуют поля: {', '.join(missing_fields)}"
+    response_data = response_json(response)
+    try:
+        validate(response_data)
+    except fastjsonschema.JsonSchemaException as error:
+        pytest.fail(f"Ответ не соответствует схеме: {error}")
 
-def test_get_single_user():
+@pytest.mark.live
+def test_user_crud_lifecycle(api_session):
     """
-    Тест GET запроса для получения информации о конкретном пользователе.
-    Проверяет статус-код ответа и данные пользователя.
+    Тест полного жизненного цикла пользователя: POST -> PUT -> PATCH -> DELETE.
+    Проверяет статус-коды и возвращаемые данные на каждом шаге.
     """
-    user_id = 2
-    url = f"{BASE_URL}/users/{user_id}"
-    response = requests.get(url)
-    log_request_info("GET", url, response=response)
-    assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
-
-    response_data = response.json()
-    assert 'data' in response_data, "Ответ не содержит ключ 'data'"
-
-    user_data = response_data['data']
-    assert user_data[
-               'id'] == user_id, f"ID пользователя в ответе ({user_data['id']}) не соответствует запрошенному ({user_id})"
-    assert 'email' in user_data, "Данные пользователя не содержат email"
-    assert 'first_name' in user_data, "Данные пользователя не содержат first_name"
-    assert 'last_name' in user_data, "Данные пользователя не содержат last_name"
-    email = user_data['email']
-    assert '@' in email, f"Email пользователя имеет неверный формат: {email}"
-
-def test_create_user():
-    """
-    Тест POST запроса для создания нового пользователя.
-    Проверяет статус-код ответа и возвращаемые данные.
-    Сохраняет ID созданного пользователя для последующих тестов.
-    """
-    global created_user_id, test_user_data
-    test_user_data = {
+    user_data = {
         "name": f"Test User {generate_random_string()}",
         "job": "QA Engineer"
     }
-    url = f"{BASE_URL}/users"
-    response = requests.post(url, json=test_user_data)
-    log_request_info("POST", url, test_user_data, response)
+    url = USERS_URL
+    response = api_session.post(url, json=user_data)
+    log_request_info("POST", url, user_data, response)
     assert response.status_code == 201, f"Ожидался статус-код 201, получен {response.status_code}"
 
-    response_data = response.json()
+    response_data = response_json(response)
     assert 'id' in response_data, "Ответ не содержит ID созданного пользователя"
     assert 'name' in response_data, "Ответ не содержит имя пользователя"
-    assert response_data['name'] == test_user_data['name'], "Имя пользователя в ответе не соответствует отправленному"
-    created_user_id = response_data['id']
-
-
-def test_update_user_put():
-    """
-    Тест PUT запроса для полного обновления данных пользователя.
-    Проверяет статус-код ответа и обновленные данные.
-    Использует ID пользователя, созданного в предыдущем тесте.
-    """
-    global test_user_data
-    if not created_user_id:
-        pytest.skip("Пропуск теста, так как ID пользователя не был получен")
+    assert response_data['name'] == user_data['name'], "Имя пользователя в ответе не соответствует отправленному"
+    uid = response_data['id']
 
     updated_user_data = {
         "name": f"Updated User {generate_random_string()}",
         "job": "Senior QA Engineer"
     }
-
-    url = f"{BASE_URL}/users/{created_user_id}"
-    response = requests.put(url, json=updated_user_data)
+    url = user_url(uid)
+    response = api_session.put(url, json=updated_user_data)
     log_request_info("PUT", url, updated_user_data, response)
     assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
 
-    response_data = response.json()
+    response_data = response_json(response)
     assert 'name' in response_data, "Ответ не содержит имя пользователя"
     assert response_data['name'] == updated_user_data[
         'name'], "Имя пользователя в ответе не соответствует отправленному"
 
-    test_user_data = updated_user_data
-
-
-def test_update_user_patch():
-    """
-    Тест PATCH запроса для частичного обновления данных пользователя.
-    Проверяет статус-код ответа и обновленные данные.
-    """
-    if not created_user_id:
-        pytest.skip("Пропуск теста, так как ID пользователя не был получен")
     patch_data = {
         "job": "Lead QA Engineer"
     }
-
-    url = f"{BASE_URL}/users/{created_user_id}"
-    response = requests.patch(url, json=patch_data)
+    response = api_session.patch(url, json=patch_data)
     log_request_info("PATCH", url, patch_data, response)
     assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
 
-    response_data = response.json()
+    response_data = response_json(response)
     assert 'job' in response_data, "Ответ не содержит должность пользователя"
     assert response_data['job'] == patch_data['job'], "Должность пользователя в ответе не соответствует отправленной"
 
-def test_delete_user():
-    """
-    Тест DELETE запроса для удаления пользователя.
-    Проверяет статус-код ответа.
-    """
-    if not created_user_id:
-        pytest.skip("Пропуск теста, так как ID пользователя не был получен")
-    url = f"{BASE_URL}/users/{created_user_id}"
-    response = requests.delete(url)
+    response = api_session.delete(url)
     log_request_info("DELETE", url, response=response)
     assert response.status_code == 204, f"Ожидался статус-код 204, получен {response.status_code}"
     assert response.text == "", "Ответ на DELETE запрос должен быть пустым"
 
-def test_get_nonexistent_user():
+@pytest.mark.live
+def test_get_nonexistent_user(api_session):
     """
     Негативный тест GET запроса для получения несуществующего пользователя.
     Проверяет, что API возвращает правильный статус-код ошибки.
     """
     user_id = 999
-    url = f"{BASE_URL}/users/{user_id}"
-    response = requests.get(url)
+    url = user_url(user_id)
+    response = api_session.get(url)
     log_request_info("GET", url, response=response)
     assert response.status_code == 404, f"Ожидался статус-код 404, получен {response.status_code}"
 
-def test_create_user_invalid_data():
+def test_create_user_invalid_data(api_session):
     """
     Негативный тест POST запроса с невалидными данными.
     Проверяет обработку ошибочных данных сервером.
     """
     empty_data = {}
-    url = f"{BASE_URL}/users"
-    response = requests.post(url, json=empty_data)
+    url = USERS_URL
+    response = api_session.post(url, json=empty_data)
     log_request_info("POST", url, empty_data, response)
     assert response.status_code == 201, f"Ожидался статус-код 201, получен {response.status_code}"
-def test_register_user_successful():
+@pytest.mark.live
+def test_register_user_successful(api_session):
     """
     Тест POST запроса для регистрации пользователя.
     Проверяет успешную регистрацию и получение токена.
     """
-    register_data = {
-        "email": "eve.holt@reqres.in",
-        "password": "pistol"
-    }
-    url = f"{BASE_URL}/register"
-    response = requests.post(url, json=register_data)
-    log_request_info("POST", url, register_data, response)
+    url = REGISTER_URL
+    response = api_session.post(url, data=REGISTER_BODY, headers=JSON_HEADERS)
+    log_request_info("POST", url, REGISTER_DATA, response)
     assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
 
-    response_data = response.json()
+    response_data = response_json(response)
     assert 'token' in response_data, "Ответ не содержит токен"
     assert 'id' in response_data, "Ответ не содержит ID пользователя"
 
-def test_get_users_with_pagination():
-    """
-    Тест GET запроса для проверки пагинации API.
-    Проверяет, что запрос с параметрами page=2 и per_page=3 работает корректно.
-    """
-    page_number = 2
-    per_page_count = 3
-    url = f"{BASE_URL}/users?page={page_number}&per_page={per_page_count}"
-    response = requests.get(url)
-    log_request_info("GET", url, response=response)
-    assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
-
-    response_data = response.json()
-    assert 'page' in response_data, "Ответ не содержит ключ 'page'"
-    assert response_data['page'] == page_number, f"Ожидалась страница {page_number}, получена {response_data['page']}"
-    assert 'data' in response_data, "Ответ не содержит ключ 'data'"
-    user_list = response_data['data']
-    assert len(user_list) <= per_page_count, f"Ожидалось пользователей: {per_page_count}, получено: {len(user_list)}"
-
-
-def test_register_user_unsuccessful():
+@pytest.mark.live
+def test_register_user_unsuccessful(api_session):
     """
     Негативный тест POST запроса для регистрации пользователя без указания пароля.
     Проверяет обработку ошибки сервером.
     """
-    incomplete_data = {
-        "email": "sydney@fife"
-    }
-
-    url = f"{BASE_URL}/register"
-    response = requests.post(url, json=incomplete_data)
-    log_request_info("POST", url, incomplete_data, response)
+    url = REGISTER_URL
+    response = api_session.post(url, data=INCOMPLETE_REGISTER_BODY, headers=JSON_HEADERS)
+    log_request_info("POST", url, INCOMPLETE_REGISTER_DATA, response)
     assert response.status_code == 400, f"Ожидался статус-код 400, получен {response.status_code}"
 
-    response_data = response.json()
+    response_data = response_json(response)
     assert 'error' in response_data, "Ответ не содержит сообщение об ошибке"
 
-def test_login_successful():
+@pytest.mark.live
+def test_login_successful(api_session):
     """
     Тест успешного входа в систему.
     Отправляет POST-запрос с данными существующего пользователя и проверяет ответ.
     """
-    url = f"{BASE_URL}/login"
-    user_data = {
-        "email": "eve.holt@reqres.in",
-        "password": "cityslicka"
-    }
-    response = requests.post(url, json=user_data)
-    log_request_info("POST", url, response=response, data=user_data)
+    url = LOGIN_URL
+    response = api_session.post(url, data=LOGIN_BODY, headers=JSON_HEADERS)
+    log_request_info("POST", url, response=response, data=LOGIN_DATA)
     assert response.status_code == 200, f"Ожидался статус-код 200, получен {response.status_code}"
 
-    response_data = response.json()
+    response_data = response_json(response)
     assert 'token' in response_data, "Ответ не содержит ключ 'token'"
-
-if __name__ == "__main__":
-    print("Запуск тестов API...")
-
-    test_get_users_list()
-    test_get_single_user()
-    test_create_user()
-    test_update_user_put()
-    test_update_user_patch()
-    test_delete_user()
-    test_get_nonexistent_user()
-    test_create_user_invalid_data()
-    test_register_user_successful()
-    test_register_user_unsuccessful()
-    test_get_users_with_pagination()
-    test_login_successful()
-
-    print("\nВсе тесты выполнены!")
\ No newline at end of file